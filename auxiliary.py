@@ -1,13 +1,20 @@
 import math
 
+# Tolerance of event times found by bisection, in seconds
+TIME_EPS = 1e-9
+
 
 class Point:
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
 
 
 class Line:
+    __slots__ = ('startX', 'startY', 'endX', 'endY')
+
     def __init__(self, start_x, start_y, end_x, end_y):
         self.startX = start_x
         self.startY = start_y
@@ -16,6 +23,8 @@ class Line:
 
 
 class Circle:
+    __slots__ = ('x', 'y', 'radius')
+
     def __init__(self, x, y, radius):
         self.x = x
         self.y = y
@@ -26,65 +35,71 @@ def dist(a, b):
     return math.hypot(a.x - b.x, a.y - b.y)
 
 
-def construct_tangents(robot, obstacle):
-    tangents = []
-
-    robot_to_obstacle = math.hypot(obstacle.x - robot.x, obstacle.y - robot.y)
-    robot_radius = robot.size
-
-    if robot_to_obstacle <= 2 * robot_radius:
-        return tangents
+def tangent_angle(x, y, radius, obstacle_x, obstacle_y, side):
+    # Angle of the tangent from (x, y) on the given side (1 or -1) of an obstacle,
+    # None if the obstacle is too close to pass
+    robot_to_obstacle = math.hypot(obstacle_x - x, obstacle_y - y)
+    if robot_to_obstacle <= 2 * radius:
+        return None
 
     # Calculate the angle between the robot and the obstacle
-    angle_to_obstacle = math.atan2(obstacle.y - robot.y, obstacle.x - robot.x)
+    angle_to_obstacle = math.atan2(obstacle_y - y, obstacle_x - x)
+
+    # Offset it by the tangent half angle
+    return angle_to_obstacle + side * math.asin(2 * radius / robot_to_obstacle)
 
-    # Calculate the tangent angles
-    tangent_angle_1 = angle_to_obstacle + math.asin(2 * robot_radius / robot_to_obstacle)
-    tangent_angle_2 = angle_to_obstacle - math.asin(2 * robot_radius / robot_to_obstacle)
 
-    # Calculate the tangent points
-    tangent_point_1 = Point(robot.x + robot_radius * math.cos(tangent_angle_1),
-                            robot.y + robot_radius * math.sin(tangent_angle_1))
+def tangent_cut(start_x, start_y, end_x, end_y, radius, obstacle_x, obstacle_y, side):
+    # Fraction of the path from start to end before it crosses that tangent, None if it does not
+    angle = tangent_angle(start_x, start_y, radius, obstacle_x, obstacle_y, side)
+    if angle is None:
+        return None
+    return segment_intersection_t(start_x, start_y, end_x, end_y, start_x, start_y,
+                                  start_x + radius * math.cos(angle), start_y + radius * math.sin(angle))
 
-    tangent_point_2 = Point(robot.x + robot_radius * math.cos(tangent_angle_2),
-                            robot.y + robot_radius * math.sin(tangent_angle_2))
 
-    # Create tangent lines
-    tangent_line_1 = Line(robot.x, robot.y, tangent_point_1.x, tangent_point_1.y)
-    tangent_line_2 = Line(robot.x, robot.y, tangent_point_2.x, tangent_point_2.y)
+def construct_tangents(robot, obstacle):
+    tangents = []
 
-    tangents.append(tangent_line_1)
-    tangents.append(tangent_line_2)
+    for side in (1, -1):
+        angle = tangent_angle(robot.x, robot.y, robot.size, obstacle.x, obstacle.y, side)
+        if angle is None:
+            return tangents
+        tangents.append(Line(robot.x, robot.y,
+                             robot.x + robot.size * math.cos(angle), robot.y + robot.size * math.sin(angle)))
 
     return tangents
 
 
 def calculate_path_length(start_point, end_point, obstacles):
-    path_length = math.hypot(end_point.x - start_point.x, end_point.y - start_point.y)
+    sx = start_point.x
+    sy = start_point.y
+    ex = end_point.x
+    ey = end_point.y
+    robot_radius = start_point.size
+    full_length = math.hypot(ex - sx, ey - sy)
+    path_length = full_length
 
     for obstacle in obstacles:
-        tangents = construct_tangents(start_point, obstacle)
-
-        for tangent in tangents:
-            intersection_point = get_line_intersection(start_point, end_point, Point(tangent.startX, tangent.startY),
-                                                       Point(tangent.endX, tangent.endY))
-
-            if intersection_point:
-                partial_path_length = math.hypot(intersection_point.x - start_point.x,
-                                                 intersection_point.y - start_point.y)
-
-                if partial_path_length < path_length:
-                    path_length = partial_path_length
+        # Distance to the intersection is the fraction along the path times its length
+        cut = tangent_cut(sx, sy, ex, ey, robot_radius, obstacle.x, obstacle.y, 1)
+        if cut is not None and cut * full_length < path_length:
+            path_length = cut * full_length
+        cut = tangent_cut(sx, sy, ex, ey, robot_radius, obstacle.x, obstacle.y, -1)
+        if cut is not None and cut * full_length < path_length:
+            path_length = cut * full_length
 
     return path_length
 
 
-def get_line_intersection(line1_start, line1_end, line2_start, line2_end):
+def segment_intersection_t(x1, y1, x2, y2, x3, y3, x4, y4):
+    # Same as get_line_intersection, but on raw coordinates and returning
+    # the t parameter along the first segment, so no Points are built
     # Calculate the differences
-    delta_x1 = line1_end.x - line1_start.x
-    delta_y1 = line1_end.y - line1_start.y
-    delta_x2 = line2_end.x - line2_start.x
-    delta_y2 = line2_end.y - line2_start.y
+    delta_x1 = x2 - x1
+    delta_y1 = y2 - y1
+    delta_x2 = x4 - x3
+    delta_y2 = y4 - y3
 
     # Calculate the determinants
     determinant = delta_x1 * delta_y2 - delta_x2 * delta_y1
@@ -94,23 +109,33 @@ def get_line_intersection(line1_start, line1_end, line2_start, line2_end):
         return None
 
     # Calculate the differences between the start points
-    delta_x_start = line1_start.x - line2_start.x
-    delta_y_start = line1_start.y - line2_start.y
+    delta_x_start = x1 - x3
+    delta_y_start = y1 - y3
 
     # Calculate the t parameters
     t1 = (delta_x_start * delta_y2 - delta_x2 * delta_y_start) / determinant
     t2 = (delta_x_start * delta_y1 - delta_x1 * delta_y_start) / determinant
 
     if 0 <= t1 <= 1 and 0 <= t2 <= 1:
-        # The lines intersect within their segments
-        intersection_x = line1_start.x + t1 * delta_x1
-        intersection_y = line1_start.y + t1 * delta_y1
-        return Point(intersection_x, intersection_y)
+        return t1
 
     # The lines do not intersect within their segments
     return None
 
 
+def get_line_intersection(line1_start, line1_end, line2_start, line2_end):
+    t1 = segment_intersection_t(line1_start.x, line1_start.y, line1_end.x, line1_end.y,
+                                line2_start.x, line2_start.y, line2_end.x, line2_end.y)
+
+    if t1 is None:
+        return None
+
+    # The lines intersect within their segments
+    intersection_x = line1_start.x + t1 * (line1_end.x - line1_start.x)
+    intersection_y = line1_start.y + t1 * (line1_end.y - line1_start.y)
+    return Point(intersection_x, intersection_y)
+
+
 def vect_mult(v, u):
     return v.x * u.x + v.y * u.y
 
@@ -125,3 +150,114 @@ def format_angle(ang):
     while ang < -math.pi:
         ang += 2 * math.pi
     return ang
+
+
+def drag_travel(k, t):
+    # Distance covered per unit of initial speed under exponential drag k over time t,
+    # i.e. the integral of exp(-k * s) for s in [0, t]
+    if k == 0:
+        return t
+    return -math.expm1(-k * t) / k
+
+
+def drag_time(k, travel):
+    # Inverse of drag_travel: time after which drag k has covered travel, None if it never does
+    if k == 0:
+        return travel
+    if k * travel >= 1:
+        return None
+    return -math.log1p(-k * travel) / k
+
+
+def wall_hit_time(pos, v, k, low, high):
+    # Time until a coordinate moving at v under drag k reaches the wall it is heading to,
+    # 0 if it is already past that wall, None if drag stops it before the wall
+    if v < 0:
+        ratio = (low - pos) / v
+    elif v > 0:
+        ratio = (high - pos) / v
+    else:
+        return None
+
+    if ratio <= 0:
+        return 0.0
+    return drag_time(k, ratio)
+
+
+def circle_hit_time(px, py, vx, vy, k, reach):
+    # Time until a point at offset (px, py) from a resting circle centre, moving at (vx, vy)
+    # under drag k, first comes within reach of the centre. None if it is already inside,
+    # moves away, misses, or drag stops it first
+    b = px * vx + py * vy
+    if b >= 0:
+        return None
+    c = px * px + py * py - reach * reach
+    if c < 0:
+        return None
+    a = vx * vx + vy * vy
+    disc = b * b - a * c
+    if disc < 0:
+        return None
+
+    # Smaller root of a * s^2 + 2 * b * s + c = 0, written to avoid cancellation
+    return drag_time(k, c / (math.sqrt(disc) - b))
+
+
+def box_hit_time(x, y, vx, vy, k, left, top, right, bottom):
+    # Time until a point moving at (vx, vy) under drag k enters a resting box. None if it is
+    # already inside, moves away, misses, or drag stops it first
+    if vx != 0:
+        enter_x = (left - x) / vx
+        leave_x = (right - x) / vx
+        if enter_x > leave_x:
+            enter_x, leave_x = leave_x, enter_x
+    elif left <= x <= right:
+        enter_x = -math.inf
+        leave_x = math.inf
+    else:
+        return None
+
+    if vy != 0:
+        enter_y = (top - y) / vy
+        leave_y = (bottom - y) / vy
+        if enter_y > leave_y:
+            enter_y, leave_y = leave_y, enter_y
+    elif top <= y <= bottom:
+        enter_y = -math.inf
+        leave_y = math.inf
+    else:
+        return None
+
+    # The path is inside the box between the later entry and the earlier exit of the two slabs
+    enter = enter_x if enter_x > enter_y else enter_y
+    leave = leave_x if leave_x < leave_y else leave_y
+    if enter < 0 or enter >= leave:
+        return None
+    return drag_time(k, enter)
+
+
+def drag_gravity_height(z, vz, k, g, t):
+    # Exact height after time t under exponential drag k and gravity g
+    g_k = g / k
+    return z + (vz + g_k) * drag_travel(k, t) - g_k * t
+
+
+def landing_time(z, vz, k, g, t_max):
+    # First time in [0, t_max] at which the height reaches the ground, None if it stays above it
+    if drag_gravity_height(z, vz, k, g, t_max) >= 0:
+        return None
+
+    # The height only decreases after the apex, so bisect between the apex and t_max
+    lo = 0.0
+    if vz > 0:
+        lo = min(math.log1p(k * vz / g) / k, t_max)
+    hi = t_max
+    for _ in range(100):
+        if hi - lo <= TIME_EPS:
+            break
+        mid = 0.5 * (lo + hi)
+        if drag_gravity_height(z, vz, k, g, mid) > 0:
+            lo = mid
+        else:
+            hi = mid
+    return hi
@@ -21,3 +21,6 @@ GOAL_WALL_THICKNESS = 20 * SCALE
 GOAL_Y_POSITION = SCREEN_HEIGHT / 2 - GOAL_WIDTH / 2
 GOAL_1_X_POSITION = (SCREEN_WIDTH - FIELD_W) / 2 - GOAL_DEPTH
 GOAL_2_X_POSITION = (SCREEN_WIDTH + FIELD_W) / 2
+
+# Maximum number of event substeps (wall contacts, landing) per update
+MAX_SUBSTEPS = 8
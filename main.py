@@ -8,6 +8,10 @@ import robot
 
 
 class Ball:
+    __slots__ = ('x', 'y', 'z', 'velocity_x', 'velocity_y', 'velocity_z', 'radius', 'kicked', 'kicked_id', 'mass',
+                 'friction', 'air_resistance', 'gravity', 'decay_dt', 'air_decay', 'air_travel', 'ground_decay',
+                 'ground_travel', 'goal_hit')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -18,39 +22,137 @@ class Ball:
         self.radius = 43 * const.SCALE
         self.kicked = False
         self.kicked_id = 0
+        self.goal_hit = None  # Goal the ball bounced out of during the last update
 
         self.mass = 0.046  # Ball mass
         self.friction = 1.75  # Friction coefficient
         self.air_resistance = 1.05  # Air resistance coefficient
-        self.gravity = 9.81 * const.SCALE  # Gravitational acceleration
-
-    def update(self, goals, dt):
-        self.handle_goal_collisions(goals)
-        if self.z > 0:
-            # Apply friction and air resistance
-            self.velocity_x *= math.exp(-self.air_resistance * dt)
-            self.velocity_y *= math.exp(-self.air_resistance * dt)
-            self.velocity_z *= math.exp(-self.air_resistance * dt)
+        self.gravity = 9.81 * 1000 * const.SCALE  # Gravitational acceleration
+
+        # Decay and travel factors cached for the last dt seen by update
+        self.decay_dt = 0
+        self.air_decay = 1.0
+        self.air_travel = 0.0
+        self.ground_decay = 1.0
+        self.ground_travel = 0.0
+
+    def update(self, goals, robots, dt):
+        self.goal_hit = None
+
+        if dt != self.decay_dt:
+            self.decay_dt = dt
+            self.air_decay = math.exp(-self.air_resistance * dt)
+            self.air_travel = auxiliary.drag_travel(self.air_resistance, dt)
+            self.ground_decay = math.exp(-(self.friction + self.air_resistance) * dt)
+            self.ground_travel = auxiliary.drag_travel(self.friction + self.air_resistance, dt)
+
+        # Integrate exactly up to each landing, wall, goal or robot contact inside the step, handle it and carry on
+        low_x = const.WALL_THICKNESS
+        high_x = const.SCREEN_WIDTH - const.WALL_THICKNESS
+        low_y = const.WALL_THICKNESS
+        high_y = const.SCREEN_HEIGHT - const.WALL_THICKNESS
+
+        # Fast path: the whole step stays clear of the walls, the ground, the goals and the robots,
+        # so no substeps are needed
+        if self.z > 0 or self.velocity_z > 0:
+            travel = self.air_travel
+            g_k = self.gravity / self.air_resistance
+            lands = self.z + ((self.velocity_z + g_k) * travel - g_k * dt) < 0
         else:
-            self.velocity_x *= math.exp(-(self.friction + self.air_resistance) * dt)
-            self.velocity_y *= math.exp(-(self.friction + self.air_resistance) * dt)
-            self.velocity_z *= math.exp(-self.air_resistance * dt)
-
-        # Apply gravity effect
-        self.velocity_z -= self.gravity
-        # Update the ball's position
-        self.x += self.velocity_x * dt
-        self.y += self.velocity_y * dt
-        self.z += self.velocity_z * dt  # Update z position
+            travel = self.ground_travel
+            lands = False
+        reach_x = abs(self.velocity_x) * travel
+        reach_y = abs(self.velocity_y) * travel
+        if not lands and low_x < self.x - reach_x and self.x + reach_x < high_x and \
+                low_y < self.y - reach_y and self.y + reach_y < high_y and \
+                not self.may_enter_goal(goals, reach_x, reach_y) and \
+                not self.may_touch_robot(robots, reach_x + reach_y):
+            self.advance(dt)
+            return
+
+        remaining = dt
+        substeps = 0
+        while True:
+            if self.z > 0 or self.velocity_z > 0:
+                k = self.air_resistance
+                t_land = auxiliary.landing_time(self.z, self.velocity_z, k, self.gravity, remaining)
+            else:
+                k = self.friction + self.air_resistance
+                t_land = None
+            t_x = auxiliary.wall_hit_time(self.x, self.velocity_x, k, low_x, high_x)
+            t_y = auxiliary.wall_hit_time(self.y, self.velocity_y, k, low_y, high_y)
+            step = remaining
+            if t_land is not None and t_land < step:
+                step = t_land
+            if t_x is not None and t_x < step:
+                step = t_x
+            if t_y is not None and t_y < step:
+                step = t_y
+
+            hit_goal = None
+            i = 0
+            while i < len(goals):
+                goal = goals[i]
+                i += 1
+                t_g = auxiliary.box_hit_time(self.x, self.y, self.velocity_x, self.velocity_y, k,
+                                             goal.x, goal.y, goal.x + goal.depth, goal.y + goal.width)
+                if t_g is not None and t_g < step:
+                    step = t_g
+                    hit_goal = goal
+
+            # Robots go last, so hit_robot is only set when a robot is the earliest event.
+            # They have already moved this tick, so the ball is swept against where they are now
+            hit_robot = None
+            i = 0
+            while i < len(robots):
+                r = robots[i]
+                i += 1
+                if self.z >= r.height:
+                    continue
+                t_r = auxiliary.circle_hit_time(self.x - r.x, self.y - r.y, self.velocity_x, self.velocity_y, k,
+                                                (r.size + self.radius) * 1.1)
+                if t_r is not None and t_r < step:
+                    step = t_r
+                    hit_robot = r
+                    hit_goal = None
+
+            if step >= remaining or substeps >= const.MAX_SUBSTEPS:
+                self.advance(remaining)
+                break
+
+            self.advance(step)
+            remaining -= step
+            substeps += 1
+
+            if step == t_land:
+                self.z = 0  # The ball should not go below the ground level
+                self.velocity_z = 0
+            if step == t_x:
+                self.velocity_x *= -1  # Reverse x velocity
+            if step == t_y:
+                self.velocity_y *= -1  # Reverse y velocity
+            if hit_goal is not None:
+                self.hit_goal(hit_goal)
+            if hit_robot is not None:
+                self.hit_robot(hit_robot)
+
         if self.z < 0:
             self.z = 0  # The ball should not go below the ground level
             self.velocity_z = 0
 
-        # Check ball collision with walls
-        if self.x <= const.WALL_THICKNESS or self.x >= const.SCREEN_WIDTH - const.WALL_THICKNESS:
-            self.velocity_x *= -1  # Reverse x velocity
-        if self.y <= const.WALL_THICKNESS or self.y >= const.SCREEN_HEIGHT - const.WALL_THICKNESS:
-            self.velocity_y *= -1  # Reverse y velocity
+        # When the substeps run out the rest of the step skips the wall checks, so keep the ball on the field
+        if self.x < low_x:
+            self.x = low_x
+            self.velocity_x = abs(self.velocity_x)
+        elif self.x > high_x:
+            self.x = high_x
+            self.velocity_x = -abs(self.velocity_x)
+        if self.y < low_y:
+            self.y = low_y
+            self.velocity_y = abs(self.velocity_y)
+        elif self.y > high_y:
+            self.y = high_y
+            self.velocity_y = -abs(self.velocity_y)
 
         '''if self.x <= (const.SCREEN_WIDTH - const.FIELD_W) / 2 or self.x >= (const.SCREEN_WIDTH - const.FIELD_W) / 2 + const.FIELD_W:
             self.velocity_x = 0
@@ -67,12 +169,77 @@ class Ball:
             else:
                 self.y = (const.SCREEN_HEIGHT - const.FIELD_H) / 2 + const.FIELD_H'''
 
-    def handle_goal_collisions(self, goals):
-        for goal in goals:
-            if goal.x <= self.x <= goal.x + goal.depth and goal.y <= self.y <= goal.y + goal.width:
-                # The robot is inside the goal, so we reverse its speed
-                self.velocity_x = -self.velocity_x
-                self.velocity_y = -self.velocity_y
+    def advance(self, dt):
+        # Exact solution of the exponential drag plus gravity motion over dt.
+        # Full steps use the factors cached by update, substeps compute their own
+        if self.z > 0 or self.velocity_z > 0:
+            # In the air only air resistance slows the ball down, gravity pulls it towards the terminal speed
+            if dt == self.decay_dt:
+                decay = self.air_decay
+                travel = self.air_travel
+            else:
+                decay = math.exp(-self.air_resistance * dt)
+                travel = auxiliary.drag_travel(self.air_resistance, dt)
+            g_k = self.gravity / self.air_resistance
+            self.z += (self.velocity_z + g_k) * travel - g_k * dt
+            self.velocity_z = (self.velocity_z + g_k) * decay - g_k
+        elif dt == self.decay_dt:
+            decay = self.ground_decay
+            travel = self.ground_travel
+        else:
+            decay = math.exp(-(self.friction + self.air_resistance) * dt)
+            travel = auxiliary.drag_travel(self.friction + self.air_resistance, dt)
+
+        self.x += self.velocity_x * travel
+        self.y += self.velocity_y * travel
+        self.velocity_x *= decay
+        self.velocity_y *= decay
+
+    def may_touch_robot(self, robots, reach):
+        # Cheap check whether moving by up to reach could bring the ball into contact with a robot
+        i = 0
+        while i < len(robots):
+            r = robots[i]
+            i += 1
+            if self.z >= r.height:
+                continue
+            dx = self.x - r.x
+            dy = self.y - r.y
+            contact = (r.size + self.radius) * 1.1
+            dist_sq = dx * dx + dy * dy
+            # Balls already in contact are handled by Robot.handle_collisions once per update
+            if contact * contact <= dist_sq <= (contact + reach) * (contact + reach) and \
+                    dx * self.velocity_x + dy * self.velocity_y < 0:
+                return True
+        return False
+
+    def hit_robot(self, r):
+        # Contact event: let the robot deflect the ball, then stop whatever is still heading into it
+        r.collide_with_ball(self)
+        dx = self.x - r.x
+        dy = self.y - r.y
+        dist_sq = dx * dx + dy * dy
+        inward = dx * self.velocity_x + dy * self.velocity_y
+        if inward < 0 and dist_sq > 0:
+            self.velocity_x -= inward * dx / dist_sq
+            self.velocity_y -= inward * dy / dist_sq
+
+    def may_enter_goal(self, goals, reach_x, reach_y):
+        # Cheap check whether moving by up to (reach_x, reach_y) could take the ball into a goal
+        i = 0
+        while i < len(goals):
+            goal = goals[i]
+            i += 1
+            if goal.x - reach_x <= self.x <= goal.x + goal.depth + reach_x and \
+                    goal.y - reach_y <= self.y <= goal.y + goal.width + reach_y:
+                return True
+        return False
+
+    def hit_goal(self, goal):
+        # The ball entered the goal, so we reverse its speed and remember it for Goal.check_goal
+        self.velocity_x = -self.velocity_x
+        self.velocity_y = -self.velocity_y
+        self.goal_hit = goal
 
     def render(self, screen):
         # Render the ball on the screen
@@ -89,7 +256,6 @@ class Ball:
         self.velocity_z = 0
         self.kicked = True
         self.kicked_id = rId
-        print(self.velocity_x, self.velocity_y)
 
     def kick_up(self, angle, up_angle, power, rId, speedX, speedY):
         # Perform the kick action based on the provided angle and power
@@ -100,7 +266,6 @@ class Ball:
         self.velocity_z = ver_speed
         self.kicked = True
         self.kicked_id = rId
-        print()
 
     def goto(self, point):
         self.x = point.x
@@ -111,6 +276,8 @@ class Ball:
 
 
 class Goal:
+    __slots__ = ('x', 'y', 'width', 'height', 'depth', 'WALL_THICKNESS')
+
     def __init__(self, x):
         self.x = x
         self.y = const.GOAL_Y_POSITION
@@ -124,7 +291,9 @@ class Goal:
         pygame.draw.rect(screen, (255, 255, 255), (self.x, self.y, self.depth, self.width), const.LINE_THICKNESS, 0)
 
     def check_goal(self, ball):
-        # Check if the ball is inside the goal
+        # Check if the ball bounced out of the goal on the last update or is inside it
+        if ball.goal_hit is self:
+            return True
         if self.x < ball.x < self.x + self.depth and self.y < ball.y < self.y + self.width:
             return True
         return False
@@ -298,7 +467,7 @@ class Game:
             # Update robot and ball(also try to fix tunneling)
             for r in self.robots:
                 r.update(self.robots, self.ball, dt)
-            self.ball.update(self.goals, dt)
+            self.ball.update(self.goals, self.robots, dt)
 
             for r in self.robots:
                 self.render_robot(r)
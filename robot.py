@@ -2,8 +2,16 @@ import const
 import auxiliary
 import math
 
+# Angle tolerances, precomputed so the per-tick code does not redo the division
+TEN_DEGREES = 10 / (180 / math.pi)
+TWENTY_DEGREES = 20 / (180 / math.pi)
+
 
 class Robot:
+    __slots__ = ('rId', 'x', 'y', 'size', 'height', 'maxSpeed', 'maxSpeedR', 'direction_indicator_length', 'angle',
+                 'color', 'speedX', 'speedY', 'speedR', 'kick_power', 'mass', 'friction', 'up_kick_angle',
+                 'friction_dt', 'friction_decay', 'friction_travel')
+
     def __init__(self, r_id, x, y, angle, team):
         self.rId = r_id
         self.x = x
@@ -11,7 +19,7 @@ class Robot:
         self.size = 180 * const.SCALE
         self.height = 150 * const.SCALE
         self.maxSpeed = 6 * 1000 * const.SCALE
-        self.maxSpeedR = 10
+        self.maxSpeedR = 10.0
         self.direction_indicator_length = self.size * 1.3
         self.angle = angle
         if team == 'y':
@@ -29,61 +37,139 @@ class Robot:
         self.friction = 15.1  # Friction coefficient
         self.up_kick_angle = auxiliary.format_angle(45 / (180 / math.pi))
 
+        # Friction decay and travel factors cached for the last dt seen by update
+        self.friction_dt = 0
+        self.friction_decay = 1.0
+        self.friction_travel = 0.0
+
     def update(self, robots, ball, dt):
         self.handle_collisions(robots, ball)
 
-        if self.x <= const.WALL_THICKNESS:
-            self.x = const.WALL_THICKNESS
-            self.speedX = -self.speedX
-        elif self.x >= const.SCREEN_WIDTH - const.WALL_THICKNESS:
-            self.x = const.SCREEN_WIDTH - const.WALL_THICKNESS
-            self.speedX = -self.speedX
-
-        if self.y <= const.WALL_THICKNESS:
-            self.y = const.WALL_THICKNESS
-            self.speedY = -self.speedY
-        elif self.y >= const.SCREEN_HEIGHT - const.WALL_THICKNESS:
-            self.y = const.SCREEN_HEIGHT - const.WALL_THICKNESS
-            self.speedY = -self.speedY
-
-        if (self.speedX ** 2 + self.speedY ** 2) ** 0.5 > self.maxSpeed:
-            tempAng = math.atan2(self.speedY, self.speedX)
-            self.speedX = self.maxSpeed * math.cos(tempAng)
-            self.speedY = self.maxSpeed * math.sin(tempAng)
-
-        self.x += self.speedX * dt
-        self.y += self.speedY * dt
+        speed = math.hypot(self.speedX, self.speedY)
+        if speed > self.maxSpeed:
+            # Rescale onto the speed limit, keeping the direction
+            k = self.maxSpeed / speed
+            self.speedX *= k
+            self.speedY *= k
 
         if self.speedR > self.maxSpeedR:
             self.speedR = self.maxSpeedR
         if self.speedR < -self.maxSpeedR:
             self.speedR = -self.maxSpeedR
-        self.angle += self.speedR * dt
 
-        self.apply_friction(dt)
+        if dt != self.friction_dt:
+            self.friction_dt = dt
+            self.friction_decay = math.exp(-self.friction * dt)
+            self.friction_travel = auxiliary.drag_travel(self.friction, dt)
+
+        # Integrate exactly up to each wall contact inside the step, bounce there and carry on.
+        # Robot-robot contacts stay a single overlap impulse per update in handle_collisions
+        low_x = const.WALL_THICKNESS
+        high_x = const.SCREEN_WIDTH - const.WALL_THICKNESS
+        low_y = const.WALL_THICKNESS
+        high_y = const.SCREEN_HEIGHT - const.WALL_THICKNESS
+
+        # Fast path: the whole step stays clear of the walls, so no substeps are needed
+        reach_x = abs(self.speedX) * self.friction_travel
+        reach_y = abs(self.speedY) * self.friction_travel
+        if low_x < self.x - reach_x and self.x + reach_x < high_x and \
+                low_y < self.y - reach_y and self.y + reach_y < high_y:
+            self.advance(dt)
+            return
+
+        remaining = dt
+        substeps = 0
+        while True:
+            t_x = auxiliary.wall_hit_time(self.x, self.speedX, self.friction, low_x, high_x)
+            t_y = auxiliary.wall_hit_time(self.y, self.speedY, self.friction, low_y, high_y)
+            step = remaining
+            if t_x is not None and t_x < step:
+                step = t_x
+            if t_y is not None and t_y < step:
+                step = t_y
+            if step >= remaining or substeps >= const.MAX_SUBSTEPS:
+                self.advance(remaining)
+                break
+
+            self.advance(step)
+            remaining -= step
+            substeps += 1
+
+            if step == t_x:
+                self.x = low_x if self.speedX < 0 else high_x
+                self.speedX = -self.speedX
+            if step == t_y:
+                self.y = low_y if self.speedY < 0 else high_y
+                self.speedY = -self.speedY
+
+        # When the substeps run out the rest of the step skips the wall checks, so keep the robot on the field
+        if self.x < low_x:
+            self.x = low_x
+            self.speedX = abs(self.speedX)
+        elif self.x > high_x:
+            self.x = high_x
+            self.speedX = -abs(self.speedX)
+        if self.y < low_y:
+            self.y = low_y
+            self.speedY = abs(self.speedY)
+        elif self.y > high_y:
+            self.y = high_y
+            self.speedY = -abs(self.speedY)
+
+    def advance(self, dt):
+        # Exact solution of the friction decay over dt: v(t) = v * exp(-k * t).
+        # Full steps use the factors cached by update, substeps compute their own
+        if dt == self.friction_dt:
+            decay = self.friction_decay
+            travel = self.friction_travel
+        else:
+            decay = math.exp(-self.friction * dt)
+            travel = auxiliary.drag_travel(self.friction, dt)
+
+        self.x += self.speedX * travel
+        self.y += self.speedY * travel
+        self.angle += self.speedR * travel
 
-    def apply_friction(self, dt):
-        self.speedX *= math.exp(-self.friction * dt)
-        self.speedY *= math.exp(-self.friction * dt)
-        self.speedR *= math.exp(-self.friction * dt)
+        self.speedX *= decay
+        self.speedY *= decay
+        self.speedR *= decay
 
     def handle_collisions(self, robots, ball):
-        for robot in robots:
-            if robot != self:
-                distance = math.hypot(robot.x - self.x, robot.y - self.y)
-                if distance <= (self.size + robot.size):
+        x = self.x
+        y = self.y
+        size = self.size
+        # Per-tick loops walk lists by index, for/in would allocate an iterator on every call
+        i = 0
+        while i < len(robots):
+            robot = robots[i]
+            i += 1
+            if robot is not self:
+                # Compare squared distances, the root is only taken on contact
+                dx = robot.x - x
+                dy = robot.y - y
+                reach = size + robot.size
+                if dx * dx + dy * dy <= reach * reach:
                     self.collide_with_robot(robot)
 
-        distance_to_ball = math.hypot(ball.x - self.x, ball.y - self.y)
-        if distance_to_ball <= (self.size + ball.radius) * 1.1:
+        dx = ball.x - x
+        dy = ball.y - y
+        reach = (size + ball.radius) * 1.1
+        if dx * dx + dy * dy <= reach * reach:
             self.collide_with_ball(ball)
 
     def collide_with_robot(self, robot):
-        # Calculate the angle between the two robots
-        angle = math.atan2(robot.y - self.y, robot.x - self.x)
-
         # Calculate the distance between the two robots
-        distance = math.hypot(robot.x - self.x, robot.y - self.y)
+        dx = robot.x - self.x
+        dy = robot.y - self.y
+        distance = math.hypot(dx, dy)
+
+        # Direction between the two robots (atan2(0, 0) == 0 for stacked robots)
+        if distance > 0:
+            cos_a = dx / distance
+            sin_a = dy / distance
+        else:
+            cos_a = 1.0
+            sin_a = 0.0
 
         # Calculate the overlap between the two robots
         overlap = self.size + robot.size - distance
@@ -92,46 +178,59 @@ class Robot:
         impulse = overlap * self.mass * robot.mass / (self.mass + robot.mass)
 
         # Apply the impulse force to both robots
-        self.speedX -= impulse * math.cos(angle) / self.mass
-        self.speedY -= impulse * math.sin(angle) / self.mass
-        robot.speedX += impulse * math.cos(angle) / robot.mass
-        robot.speedY += impulse * math.sin(angle) / robot.mass
+        self.speedX -= impulse * cos_a / self.mass
+        self.speedY -= impulse * sin_a / self.mass
+        robot.speedX += impulse * cos_a / robot.mass
+        robot.speedY += impulse * sin_a / robot.mass
 
     def collide_with_ball(self, ball):
-        overlap = self.size + ball.radius - math.hypot(ball.x - self.x, ball.y - self.y)
-        angle = math.atan2(ball.y - self.y, ball.x - self.x)
-
-        if ball.z < self.height:
-            if ball.kicked and self.rId != ball.kicked_id:
-                if abs(auxiliary.format_angle(self.angle - angle)) < 10 / (180 / math.pi):
-                    ball_speed = ((ball.velocity_x ** 2 + ball.velocity_y ** 2) ** 0.5) * 0.5
-                else:
-                    ball_speed = ((ball.velocity_x ** 2 + ball.velocity_y ** 2) ** 0.5) * 0.9
-                ball.velocity_x = ball_speed * math.cos(angle)
-                ball.velocity_y = ball_speed * math.sin(angle)
+        if ball.z >= self.height:
+            return
+
+        dx = ball.x - self.x
+        dy = ball.y - self.y
+        distance = math.hypot(dx, dy)
+        if distance > 0:
+            cos_a = dx / distance
+            sin_a = dy / distance
+        else:
+            cos_a = 1.0
+            sin_a = 0.0
+
+        if ball.kicked and self.rId != ball.kicked_id:
+            if ball.velocity_x * cos_a + ball.velocity_y * sin_a >= 0:
+                # Already bounced off, deflecting again on every update would make the result depend on dt
+                return
+            angle = math.atan2(dy, dx)
+            if abs(auxiliary.format_angle(self.angle - angle)) < TEN_DEGREES:
+                ball_speed = math.hypot(ball.velocity_x, ball.velocity_y) * 0.5
             else:
-                overlap_x = 0.5 * overlap * math.cos(angle)
-                overlap_y = 0.5 * overlap * math.sin(angle)
-                ball.x += overlap_x
-                ball.y += overlap_y
+                ball_speed = math.hypot(ball.velocity_x, ball.velocity_y) * 0.9
+            ball.velocity_x = ball_speed * cos_a
+            ball.velocity_y = ball_speed * sin_a
+        else:
+            overlap = self.size + ball.radius - distance
+            ball.x += 0.5 * overlap * cos_a
+            ball.y += 0.5 * overlap * sin_a
 
     def go_to_point(self, point):
-        # Calculate the angle to the ball
-        angle_to_point = math.atan2(point.y - self.y, point.x - self.x)
-
-        # Calculate the distance to the ball
-        distance_to_point = math.dist((self.x, self.y), (point.x, point.y))
+        self.go_to_xy(point.x, point.y)
 
-        self.speedX = distance_to_point * math.cos(angle_to_point) * 10
-        self.speedY = distance_to_point * math.sin(angle_to_point) * 10
+    def go_to_xy(self, x, y):
+        # Speed is proportional to the distance to the point, along the direction to it
+        self.speedX = (x - self.x) * 10
+        self.speedY = (y - self.y) * 10
 
     def rotate_to_point(self, point):
-        vx = self.x - point.x
-        vy = self.y - point.y
+        self.rotate_to_xy(point.x, point.y)
+
+    def rotate_to_xy(self, x, y):
+        vx = self.x - x
+        vy = self.y - y
         ux = -math.cos(self.angle)
         uy = -math.sin(self.angle)
-        dif = -math.atan2(auxiliary.scal_mult(auxiliary.Point(vx, vy), auxiliary.Point(ux, uy)),
-                          auxiliary.vect_mult(auxiliary.Point(vx, vy), auxiliary.Point(ux, uy)))
+        # Same as scal_mult/vect_mult on Point(vx, vy) and Point(ux, uy), inlined to skip the Points
+        dif = -math.atan2(vx * uy - vy * ux, vx * ux + vy * uy)
         if abs(dif) > 0.1:
             self.speedR = dif * 7
         else:
@@ -143,10 +242,10 @@ class Robot:
             pass
         distance_to_ball = math.hypot(ball.x - self.x, ball.y - self.y)
 
-        self.rotate_to_point(ball)
+        self.rotate_to_xy(ball.x, ball.y)
         if distance_to_ball > (self.size + ball.radius):  # Adjust the threshold as needed
             # Move towards the ball
-            self.go_to_point(ball)
+            self.go_to_xy(ball.x, ball.y)
         else:
             self.kick_ball(ball)
 
@@ -157,14 +256,14 @@ class Robot:
         # Calculate the distance to the ball
         distance_to_ball = math.hypot(ball.x - self.x, ball.y - self.y)
 
-        if abs(angle_to_ball) < 10 / (180 / math.pi) and distance_to_ball < (
+        if abs(angle_to_ball) < TEN_DEGREES and distance_to_ball < (
                 self.size + ball.radius) * 1.15 and ball.z == 0:
             # ball.kick_up(self.angle, self.up_kick_angle, self.kick_power, self.rId, self.speedX, self.speedY)
             ball.kick(self.angle, self.kick_power, self.rId, self.speedX, self.speedY)
 
     def drive_to_ball_and_kick_to_point(self, ball, point, robots=None):
         # Calculate the angle to the ball
-        self.rotate_to_point(point)
+        self.rotate_to_xy(point.x, point.y)
         target_angle = math.atan2(ball.y - point.y, ball.x - point.x)
         target_x = ball.x + (ball.radius + self.size) * 5 * math.cos(target_angle)
         target_y = ball.y + (ball.radius + self.size) * 5 * math.sin(target_angle)
@@ -172,10 +271,9 @@ class Robot:
         distance_to_ball = math.hypot(ball.x - self.x, ball.y - self.y)
         if distance_to_ball > (self.size + ball.radius):  # Adjust the threshold as needed
             # Move towards the ball
-            print(auxiliary.format_angle(math.atan2(ball.y - self.y, ball.x - self.x) - self.angle))
-            if abs(auxiliary.format_angle(math.atan2(ball.y - self.y, ball.x - self.x) - self.angle)) < 20 / (180 / math.pi):
+            if abs(auxiliary.format_angle(math.atan2(ball.y - self.y, ball.x - self.x) - self.angle)) < TWENTY_DEGREES:
                 self.drive_to_ball(ball)
             else:
-                self.go_to_point(auxiliary.Point(target_x, target_y))
+                self.go_to_xy(target_x, target_y)
         else:
             self.kick_ball(ball)
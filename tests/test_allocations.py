@@ -0,0 +1,141 @@
+import sys
+import tracemalloc
+import types
+import unittest
+
+import const
+import robot
+
+try:
+    import pygame  # noqa: F401
+except ImportError:
+    # Ball lives in main.py next to the pygame front end, but its physics never touches pygame
+    sys.modules['pygame'] = types.ModuleType('pygame')
+    sys.modules['pygame.locals'] = types.ModuleType('pygame.locals')
+
+import main
+
+
+def allocated_during(func):
+    # Bytes by which traced memory rose above its final level while func() ran.
+    # Anything func allocates and frees again shows up here, unlike in a snapshot diff
+    tracemalloc.reset_peak()
+    func()
+    current, peak = tracemalloc.get_traced_memory()
+    return peak - current
+
+
+def growth(func, repeat):
+    # Bytes still traced after calling func() repeat times
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(repeat):
+        func()
+    return tracemalloc.get_traced_memory()[0] - before
+
+
+class TestSteadyStateAllocations(unittest.TestCase):
+    dt = 1 / 60
+
+    def setUp(self):
+        # A pack of overlapping robots around the ball, so every tick goes through
+        # collide_with_robot and collide_with_ball as well as Ball.update with the real goals
+        self.start = [(500.0 + 15.0 * (i % 3), 370.0 + 15.0 * (i // 3), 0.1 * i) for i in range(6)]
+        self.robots = [robot.Robot(i, x, y, angle, 'b') for i, (x, y, angle) in enumerate(self.start)]
+        self.ball = main.Ball(515.0, 385.0)
+        self.goals = [main.Goal(const.GOAL_1_X_POSITION), main.Goal(const.GOAL_2_X_POSITION)]
+        self.reset()
+
+    def reset(self):
+        # Put back fresh float objects, as a previous tick would have left behind,
+        # so the tick replaces them instead of shared constants
+        zero = 0.0
+        for r, (x, y, angle) in zip(self.robots, self.start):
+            r.x = x + zero
+            r.y = y + zero
+            r.angle = angle + zero
+            r.speedX = 100.0 + zero
+            r.speedY = -50.0 + zero
+            r.speedR = 1.0 + zero
+        self.ball.x = 515.0 + zero
+        self.ball.y = 385.0 + zero
+        self.ball.velocity_x = zero + zero
+        self.ball.velocity_y = zero + zero
+
+    def tick(self):
+        robots = self.robots
+        i = 0
+        while i < len(robots):
+            robots[i].update(robots, self.ball, self.dt)
+            i += 1
+        self.ball.update(self.goals, robots, self.dt)
+
+    def noop(self):
+        pass
+
+    def reset_and_tick(self):
+        self.reset()
+        self.tick()
+
+    def assert_no_allocations(self, func):
+        # Warm up the per-dt caches and the interpreter's free lists
+        for _ in range(3):
+            self.reset()
+            func()
+
+        tracemalloc.start()
+        try:
+            for _ in range(5):
+                self.reset()
+                self.assertEqual(allocated_during(func), 0)
+        finally:
+            tracemalloc.stop()
+
+    def test_contacts_happen(self):
+        self.tick()
+        self.assertNotEqual((self.ball.x, self.ball.y), (515.0, 385.0))
+        self.assertNotAlmostEqual(self.robots[0].speedX, 100.0 * self.robots[0].friction_decay)
+
+    def test_tick(self):
+        self.assert_no_allocations(self.tick)
+
+    def test_ticks_do_not_grow(self):
+        for _ in range(3):
+            self.reset_and_tick()
+
+        tracemalloc.start()
+        try:
+            # growth() keeps its own before value alive, so compare against an empty call
+            self.assertEqual(growth(self.reset_and_tick, 100), growth(self.noop, 100))
+        finally:
+            tracemalloc.stop()
+
+    def test_ball_update(self):
+        self.assert_no_allocations(lambda: self.ball.update(self.goals, self.robots, self.dt))
+
+    def test_rolling_ball_update(self):
+        # A ball rolling freely across the field, the common case between contacts
+        def roll():
+            self.ball.x = 300.0 + self.dt
+            self.ball.velocity_x = 500.0 + self.dt
+            self.ball.velocity_y = 200.0 + self.dt
+            self.ball.update(self.goals, self.robots, self.dt)
+        self.assert_no_allocations(roll)
+
+    def test_handle_collisions(self):
+        self.assert_no_allocations(lambda: self.robots[4].handle_collisions(self.robots, self.ball))
+
+    def test_collide_with_ball(self):
+        self.assert_no_allocations(lambda: self.robots[4].collide_with_ball(self.ball))
+
+    def test_kicked_ball_deflection(self):
+        def deflect():
+            self.ball.kicked = True
+            self.ball.kicked_id = 99
+            self.ball.velocity_x = -300.0
+            self.ball.velocity_y = -300.0
+            self.robots[0].collide_with_ball(self.ball)
+        self.assert_no_allocations(deflect)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+import math
+import sys
+import types
+import unittest
+from unittest import mock
+
+import auxiliary
+import const
+import robot
+
+try:
+    import pygame  # noqa: F401
+except ImportError:
+    # Ball lives in main.py next to the pygame front end, but its physics never touches pygame
+    sys.modules['pygame'] = types.ModuleType('pygame')
+    sys.modules['pygame.locals'] = types.ModuleType('pygame.locals')
+
+import main
+
+# Frame times the integrator has to handle, from a huge fixed step down to a fast display
+STEPS = (0.5, 0.1, 1 / 60, 1 / 240)
+# Step of the reference runs
+FINE_STEP = 1 / 4000
+# Largest position or speed difference from the reference, in px and px/s. The landing time is only
+# known to auxiliary.TIME_EPS, which at landing speeds under 1000 px/s is under 1e-6 px.
+# Without events the results agree to float rounding
+TOLERANCE = 1e-6
+
+
+def rk4_drag_gravity(z, vz, k, g, t, h=1e-4):
+    # Independent reference for dz/dt = vz, dvz/dt = -k * vz - g
+    n = round(t / h)
+    h = t / n
+    for _ in range(n):
+        k1z, k1v = vz, -k * vz - g
+        k2z, k2v = vz + 0.5 * h * k1v, -k * (vz + 0.5 * h * k1v) - g
+        k3z, k3v = vz + 0.5 * h * k2v, -k * (vz + 0.5 * h * k2v) - g
+        k4z, k4v = vz + h * k3v, -k * (vz + h * k3v) - g
+        z += h / 6 * (k1z + 2 * k2z + 2 * k3z + k4z)
+        vz += h / 6 * (k1v + 2 * k2v + 2 * k3v + k4v)
+    return z
+
+
+class TestAuxiliary(unittest.TestCase):
+    k = 1.05
+    g = 9.81 * 1000 * const.SCALE
+
+    def test_drag_gravity_height_matches_rk4(self):
+        for t in (0.1, 0.5, 1.3):
+            self.assertAlmostEqual(auxiliary.drag_gravity_height(0.0, 900.0, self.k, self.g, t),
+                                   rk4_drag_gravity(0.0, 900.0, self.k, self.g, t), delta=TOLERANCE)
+
+    def test_drag_gravity_height_composes(self):
+        # Stepping with the closed form at any dt lands on the same height as one long step
+        t_total = 1.0
+        expected = auxiliary.drag_gravity_height(5.0, 700.0, self.k, self.g, t_total)
+        g_k = self.g / self.k
+        for dt in STEPS:
+            z, vz = 5.0, 700.0
+            for _ in range(round(t_total / dt)):
+                z = auxiliary.drag_gravity_height(z, vz, self.k, self.g, dt)
+                vz = (vz + g_k) * math.exp(-self.k * dt) - g_k
+            self.assertAlmostEqual(z, expected, delta=TOLERANCE, msg=dt)
+
+    def landing_at(self, dt, z, vz):
+        # Absolute landing time found by asking landing_time one frame at a time
+        g_k = self.g / self.k
+        elapsed = 0.0
+        while True:
+            t_land = auxiliary.landing_time(z, vz, self.k, self.g, dt)
+            if t_land is not None:
+                return elapsed + t_land
+            z = auxiliary.drag_gravity_height(z, vz, self.k, self.g, dt)
+            vz = (vz + g_k) * math.exp(-self.k * dt) - g_k
+            elapsed += dt
+
+    def test_landing_time_converges(self):
+        reference = self.landing_at(FINE_STEP, 0.0, 900.0)
+        self.assertAlmostEqual(rk4_drag_gravity(0.0, 900.0, self.k, self.g, reference), 0.0, delta=TOLERANCE)
+        for dt in STEPS:
+            self.assertAlmostEqual(self.landing_at(dt, 0.0, 900.0), reference, delta=10 * auxiliary.TIME_EPS, msg=dt)
+
+    def wall_hit_at(self, dt, pos, v, k, low, high):
+        # Absolute wall hit time found by asking wall_hit_time one frame at a time
+        elapsed = 0.0
+        while elapsed < 10:
+            t_hit = auxiliary.wall_hit_time(pos, v, k, low, high)
+            if t_hit is not None and t_hit <= dt:
+                return elapsed + t_hit
+            pos += v * auxiliary.drag_travel(k, dt)
+            v *= math.exp(-k * dt)
+            elapsed += dt
+        return None
+
+    def test_wall_hit_time_converges(self):
+        reference = self.wall_hit_at(FINE_STEP, 100.0, 2500.0, 2.8, 0.0, 900.0)
+        for dt in STEPS:
+            self.assertAlmostEqual(self.wall_hit_at(dt, 100.0, 2500.0, 2.8, 0.0, 900.0), reference,
+                                   delta=10 * auxiliary.TIME_EPS, msg=dt)
+
+    def test_wall_out_of_reach(self):
+        # Drag stops the point after 2500 / 2.8 px, well short of the wall
+        self.assertIsNone(auxiliary.wall_hit_time(100.0, 2500.0, 2.8, 0.0, 5000.0))
+        self.assertIsNone(self.wall_hit_at(1 / 60, 100.0, 2500.0, 2.8, 0.0, 5000.0))
+
+    def test_circle_hit_time(self):
+        # Straight at a circle of radius 10 from 100 px away with no drag
+        self.assertAlmostEqual(auxiliary.circle_hit_time(-100.0, 0.0, 45.0, 0.0, 0, 10.0), 2.0)
+        self.assertIsNone(auxiliary.circle_hit_time(-100.0, 0.0, -45.0, 0.0, 0, 10.0))
+        self.assertIsNone(auxiliary.circle_hit_time(-100.0, 50.0, 45.0, 0.0, 0, 10.0))
+        self.assertIsNone(auxiliary.circle_hit_time(-5.0, 0.0, 45.0, 0.0, 0, 10.0))
+
+
+class TestConvergence(unittest.TestCase):
+    duration = 2.0
+
+    def assert_converges(self, run, steps=STEPS):
+        reference = run(FINE_STEP)
+        for dt in steps:
+            result = run(dt)
+            for got, expected in zip(result, reference):
+                self.assertAlmostEqual(got, expected, delta=TOLERANCE, msg=dt)
+
+    def run_robot(self, dt, x, y, speed_x, speed_y):
+        r = robot.Robot(0, x, y, 0, 'b')
+        r.speedX = speed_x
+        r.speedY = speed_y
+        r.speedR = 5.0
+        ball = main.Ball(-1000, -1000)
+        for _ in range(round(self.duration / dt)):
+            r.update([r], ball, dt)
+        return r.x, r.y, r.angle, r.speedX, r.speedY, r.speedR
+
+    def run_ball(self, dt, kick, robots=(), x=300, y=370, duration=None, goals=()):
+        ball = main.Ball(x, y)
+        kick(ball)
+        robots = list(robots)
+        goals = list(goals)
+        for _ in range(round((duration or self.duration) / dt)):
+            for r in robots:
+                r.update(robots, ball, dt)
+            ball.update(goals, robots, dt)
+        return ball.x, ball.y, ball.z, ball.velocity_x, ball.velocity_y, ball.velocity_z
+
+    def test_robot_free(self):
+        self.assert_converges(lambda dt: self.run_robot(dt, 500, 370, 600, 500))
+
+    def test_robot_wall_bounce(self):
+        self.assert_converges(lambda dt: self.run_robot(dt, const.SCREEN_WIDTH - 10, const.SCREEN_HEIGHT - 10, 600, 500))
+
+    def test_ball_rolling_wall_bounce(self):
+        self.assert_converges(lambda dt: self.run_ball(dt, lambda b: b.kick(0.7, 2500, 99, 0, 0)))
+
+    def test_ball_landing(self):
+        self.assert_converges(lambda dt: self.run_ball(dt, lambda b: b.kick_up(0.3, math.pi / 4, 2500, 99, 0, 0)))
+
+    def test_ball_deflected_by_robot(self):
+        def run(dt):
+            return self.run_ball(dt, lambda b: b.kick(0, 2500, 99, 0, 0), [robot.Robot(1, 600, 370, 0, 'b')])
+        self.assert_converges(run)
+
+        # And it really bounced back off the robot instead of passing through
+        x, _, _, velocity_x, _, _ = run(0.1)
+        self.assertLess(x, 600)
+        self.assertLess(velocity_x, 0)
+
+    def test_ball_wall_before_robot(self):
+        # The ball bounces off the top wall before it reaches the robot, within a single 0.3 s step
+        def kick(ball):
+            ball.velocity_x = 2000.0
+            ball.velocity_y = -100.0
+            ball.kicked = True
+            ball.kicked_id = 99
+
+        def run(dt):
+            return self.run_ball(dt, kick, [robot.Robot(1, 320, 2, 0, 'b')], x=100, y=5, duration=0.6)
+        self.assert_converges(run, (0.6, 0.3, 0.1, 1 / 60, 1 / 240))
+
+    def test_ball_goal_bounce(self):
+        goals = [main.Goal(const.GOAL_1_X_POSITION), main.Goal(const.GOAL_2_X_POSITION)]
+
+        def kick(ball):
+            ball.velocity_x = -1500.0
+
+        self.assert_converges(lambda dt: self.run_ball(dt, kick, duration=1.0, goals=goals))
+
+    def test_goal_counted_at_any_step(self):
+        goal = main.Goal(const.GOAL_1_X_POSITION)
+        for dt in STEPS:
+            ball = main.Ball(300, 370)
+            ball.velocity_x = -1500.0
+            scored = False
+            for _ in range(round(1.0 / dt)):
+                ball.update([goal], [], dt)
+                scored = scored or goal.check_goal(ball)
+            self.assertTrue(scored, msg=dt)
+
+    def test_substep_cap_keeps_objects_on_field(self):
+        # With no substeps allowed the walls are never found as events, the final clamp still applies
+        with mock.patch.object(const, 'MAX_SUBSTEPS', 0):
+            r = robot.Robot(0, const.SCREEN_WIDTH - 10, const.SCREEN_HEIGHT - 10, 0, 'b')
+            r.speedX = 600.0
+            r.speedY = 500.0
+            r.update([r], main.Ball(-1000, -1000), 0.5)
+            self.assertEqual((r.x, r.y), (const.SCREEN_WIDTH, const.SCREEN_HEIGHT))
+            self.assertLess(r.speedX, 0)
+            self.assertLess(r.speedY, 0)
+
+            ball = main.Ball(30, 30)
+            ball.velocity_x = -2500.0
+            ball.velocity_y = -2500.0
+            ball.update([], [], 0.5)
+            self.assertEqual((ball.x, ball.y), (0, 0))
+            self.assertGreater(ball.velocity_x, 0)
+            self.assertGreater(ball.velocity_y, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()